@@ -1,5 +1,9 @@
 import sys
 import os
+import re
+import io
+import time
+import atexit
 import contextlib
 import subprocess
 import numpy as np
@@ -10,7 +14,18 @@ from virteng.WidgetFunctions import OptimizationWidget
 from virteng.ModelsConnection import VE_params
 
 root_path = os.path.abspath(os.path.join(os.path.dirname(__file__)))
-cwd = os.getcwd()
+
+# Unit conversions between the widget values and the stored VE parameters
+CELSIUS_TO_KELVIN = 273.15
+SECONDS_PER_MINUTE = 60.0
+MG_PER_G_PER_KG_PER_KG = 1000.0
+
+# EHProperties update times in seconds, used when the file doesn't set them
+EH_TIME_DEFAULTS = {'reaction_update_time': 1.0,
+                    'fluid_update_time': 250.0,
+                    'fluid_steadystate_time': 400.0}
+# Matches e.g. "fluid_update_time    ft  [0 0 1 0 0 0 0] 250.0; //seconds"
+eh_time_pattern = re.compile(r'^\s*(' + '|'.join(EH_TIME_DEFAULTS) + r')\b[^\]\n]*\]\s*([-+\d.eE]+)\s*;', re.MULTILINE)
 
 def make_models_list(options_list, n_models=4, hpc_run=False):
 
@@ -34,6 +49,44 @@ def make_models_list(options_list, n_models=4, hpc_run=False):
 def make_output_names():
     return ['pt_out', 'eh_out', 'br_out']
 
+# All EH and bioreactor CFD submissions are recorded in a single job history
+# file, opened on first use and kept open (line buffered) for the session
+eh_case_folder = os.path.join(root_path, 'models', 'EH_OpenFOAM', 'tests', 'RushtonReact')
+job_history_fp = None
+
+def record_job_id(job_id):
+    global job_history_fp
+    if job_history_fp is None:
+        job_history_fp = open(os.path.join(eh_case_folder, 'job_history.csv'), 'a', buffering=1)
+        atexit.register(job_history_fp.close)
+    job_history_fp.write(f'{job_id}\n')
+
+def read_eh_times(eh_properties_filename):
+    """ Read the update times from an OpenFOAM EHProperties file.
+
+    :param eh_properties_filename: The path of the EHProperties file
+    :return: (dict) The times keyed by name, with ``EH_TIME_DEFAULTS``
+        filling in any the file doesn't set
+    """
+    eh_times = dict(EH_TIME_DEFAULTS)
+    with open(eh_properties_filename, 'r') as fp:
+        eh_times.update((match.group(1), float(match.group(2))) for match in eh_time_pattern.finditer(fp.read()))
+    return eh_times
+
+def set_widget_values(model, options):
+    """ Set each model property from the current value of the widget
+    with the same name, in the order the widgets were added to ``options``.
+
+    :param model: The model whose properties are set
+    :param options: (WidgetCollection)
+        The widgets used to solicit user input for this model
+    """
+    for widget_name, widget in options.__dict__.items():
+        if isinstance(widget, OptimizationWidget):
+            setattr(model, widget_name, widget.widget.value)
+        else:
+            setattr(model, widget_name, widget.value)
+
 
 class Feedstock:
     def __init__(self, fs_options):
@@ -59,11 +112,7 @@ class Feedstock:
             # self.xylan_solid_fraction = fs_options.xylan_solid_fraction.value
             # self.glucan_solid_fraction = fs_options.glucan_solid_fraction.value
             # self.initial_porosity = fs_options.initial_porosity.widget.value
-            for widget_name, widget in fs_options.__dict__.items(): 
-                if isinstance(widget, OptimizationWidget):
-                    setattr(self, widget_name, widget.widget.value)
-                else:
-                    setattr(self, widget_name, widget.value)
+            set_widget_values(self, fs_options)
 
     ##############################################
     ### Properties
@@ -141,14 +190,12 @@ class Pretreatment:
             self.initial_solid_fraction = pt_options['initial_solid_fraction']
             self.final_time = pt_options['final_time']
         else:
-            for widget_name, widget in pt_options.__dict__.items(): 
-                if isinstance(widget, OptimizationWidget):
-                    setattr(self, widget_name, widget.widget.value)
-                else:
-                    setattr(self, widget_name, widget.value)
+            set_widget_values(self, pt_options)
 
         self.pt_module_path = os.path.join(root_path, 'models', 'pretreatment_model')
-        sys.path.append(os.path.join(self.pt_module_path, 'dolfinx'))
+        pt_dolfinx_path = os.path.join(self.pt_module_path, 'dolfinx')
+        if pt_dolfinx_path not in sys.path:
+            sys.path.append(pt_dolfinx_path)
 
     ##############################################
     ### Properties
@@ -165,13 +212,13 @@ class Pretreatment:
 
     @property
     def steam_temperature(self):
-        return self.ve.pt_in['steam_temperature'] - 273.15
+        return self.ve.pt_in['steam_temperature'] - CELSIUS_TO_KELVIN
 
     @steam_temperature.setter
     def steam_temperature(self, a):
         if not 3.8 <= a <= 250.3:
             raise ValueError(f"Value {a} is outside allowed interval [3.8, 250.3]")
-        self.ve.pt_in['steam_temperature'] = float(a) + 273.15 # Conversion from celsius to kelvin
+        self.ve.pt_in['steam_temperature'] = float(a) + CELSIUS_TO_KELVIN
 
     @property
     def initial_solid_fraction(self):
@@ -185,13 +232,13 @@ class Pretreatment:
 
     @property
     def final_time(self):
-        return self.ve.pt_in['final_time'] / 60
+        return self.ve.pt_in['final_time'] / SECONDS_PER_MINUTE
 
     @final_time.setter
     def final_time(self, a):
         if not 1/60 <= a <= 1440:
             raise ValueError(f"Value {a} is outside allowed interval [1, 1440]")
-        self.ve.pt_in['final_time'] = 60 * float(a)
+        self.ve.pt_in['final_time'] = SECONDS_PER_MINUTE * float(a)
 
     ##############################################
     #
@@ -214,12 +261,12 @@ class Pretreatment:
             from run_pretreatment import run_pt
             self.ve.pt_out = run_pt(self.ve, verbose, show_plots)
         else:
-            os.chdir(os.path.join(self.pt_module_path, 'dolfinx'))
-            self.ve.write_to_file('ve_params.yml')
-            command = f'python run_pretreatment.py {verbose} {show_plots}'
-            subprocess.call(command.split(), text=True)
-            self.ve = VE_params.load_from_file('ve_params.yml', verbose=False)
-            os.chdir(root_path)
+            pt_dolfinx_path = os.path.join(self.pt_module_path, 'dolfinx')
+            params_filename = os.path.join(pt_dolfinx_path, 've_params.yml')
+            self.ve.write_to_file(params_filename)
+            command = ['python', 'run_pretreatment.py', str(verbose), str(show_plots)]
+            subprocess.call(command, cwd=pt_dolfinx_path, text=True)
+            self.ve = VE_params.load_from_file(params_filename, verbose=False)
         if verbose:
             print('Finished Pretreatment')
         if check_dict_for_nans(self.ve.pt_out):
@@ -279,24 +326,20 @@ class EnzymaticHydrolysis:
             # self.t_final = eh_options.t_final.value
             # self.model_type = eh_options.model_type.value # running select_run_function() inside
             # self.show_plots = eh_options.show_plots.value
-            for widget_name, widget in eh_options.__dict__.items(): 
-                if isinstance(widget, OptimizationWidget):
-                    setattr(self, widget_name, widget.widget.value)
-                else:
-                    setattr(self, widget_name, widget.value)
+            set_widget_values(self, eh_options)
         
     ##############################################
     ### Properties
     ##############################################
     @property
     def lambda_e(self):
-        return self.ve.eh_in['lambda_e'] * 1000 # Conversion from kg/kg to mg/g 
+        return self.ve.eh_in['lambda_e'] * MG_PER_G_PER_KG_PER_KG # Conversion from kg/kg to mg/g
 
     @lambda_e.setter
     def lambda_e(self, a):
         if not 0 <= a <= 1000:
             raise ValueError(f"Value {a} is outside allowed interval [0, 1000]")
-        self.ve.eh_in['lambda_e'] = float(a) / 1000 # Conversion from mg/g to kg/kg
+        self.ve.eh_in['lambda_e'] = float(a) / MG_PER_G_PER_KG_PER_KG # Conversion from mg/g to kg/kg
         # self.input2yaml(rewrite=True)
 
     @property
@@ -326,7 +369,7 @@ class EnzymaticHydrolysis:
 
     @model_type.setter
     def model_type(self, a):
-        if a not in ['CFD Simulation', "CFD Surrogate", 'Lignocellulose Model']:
+        if a not in self.run_functions:
             raise ValueError("Invalid value. Allowed options: 'CFD Simulation', 'CFD Surrogate', 'Lignocellulose Model'")
         self.ve.eh_in['model_type']= a
         self.select_run_function()
@@ -334,28 +377,28 @@ class EnzymaticHydrolysis:
     #
     ##############################################
 
+    # The run method and the module path it imports from for each model type
+    run_functions = {'CFD Simulation': ('run_eh_cfd_simulation', None),
+                     'CFD Surrogate': ('run_eh_cfd_surrogate',
+                                       os.path.join(root_path, 'models', 'EH_OpenFOAM', 'EH_surrogate')),
+                     'Lignocellulose Model': ('run_eh_lignocellulose_model',
+                                              os.path.join(root_path, 'models', 'two_phase_batch_model'))}
+
     def select_run_function(self):
         # selected enzymatic hydrolysis model
         if self.model_type == 'CFD Simulation':
             assert self.hpc_run, f'Cannot run EH_CFD without HPC resources. \n {os.getcwd()}'
-            self.run = self.run_eh_cfd_simulation
-        elif self.model_type == "CFD Surrogate":
-            self.run = self.run_eh_cfd_surrogate
-            eh_module_path = os.path.join(root_path, 'models', 'EH_OpenFOAM', 'EH_surrogate')
-            if eh_module_path not in sys.path:
-                sys.path.append(eh_module_path)
-        elif self.model_type == 'Lignocellulose Model':
-            self.run = self.run_eh_lignocellulose_model
-            eh_module_path = os.path.join(root_path , 'models', 'two_phase_batch_model')
-            if eh_module_path not in sys.path:
-                sys.path.append(eh_module_path)
+        run_function, eh_module_path = self.run_functions[self.model_type]
+        self.run = getattr(self, run_function)
+        if eh_module_path is not None and eh_module_path not in sys.path:
+            sys.path.append(eh_module_path)
 
 
     def run_eh_cfd_simulation(self, verbose=True):
         
         if verbose:
             print('\nRunning Enzymatic Hydrolysis Model: CFD simulation')
-        case_folder = os.path.join(root_path, 'EH_OpenFOAM', 'tests', 'RushtonReact', )
+        case_folder = eh_case_folder
 
         globalVars = {}
         globalVars['fis0'] = self.fis_0
@@ -373,20 +416,10 @@ class EnzymaticHydrolysis:
         # Get reaction_update_time, fluid_update_time, and fluid_steadystate_time
         # in order to convert the user-specified t_final into the endTime definition
         # expected by the OpenFOAM simulation
-        reaction_update_time = 1.0
-        fluid_update_time = 250.0
-        fluid_steadystate_time = 400.0
-        with open(os.path.join(case_folder, 'constant', 'EHProperties'), 'r') as fp:
-            for line in fp:
-                if '#' not in line:
-                    if 'reaction_update_time' in line:
-                        reaction_update_time = float(line.split(']')[-1].split(';')[0])
-                    elif 'fluid_update_time' in line:
-                        fluid_update_time = float(line.split(']')[-1].split(';')[0])
-                    elif 'fluid_steadystate_time' in line:
-                        fluid_steadystate_time = float(line.split(']')[-1].split(';')[0])
-
-        fintime = fluid_steadystate_time + (self.t_final/reaction_update_time + 1.0)*fluid_update_time
+        eh_times = read_eh_times(os.path.join(case_folder, 'constant', 'EHProperties'))
+
+        fintime = (eh_times['fluid_steadystate_time'] +
+                   (self.t_final/eh_times['reaction_update_time'] + 1.0)*eh_times['fluid_update_time'])
         controlDict = {'endTime': fintime}
         write_file_with_replacements(os.path.join(case_folder,'system', 'controlDict'), controlDict)
         
@@ -402,8 +435,8 @@ class EnzymaticHydrolysis:
         jobname = 'eh_cfd'
 
         # Check the queue
-        command = 'squeue -u %s -t R,PD -n %s' % (username, jobname)
-        out = subprocess.run(command.split(), capture_output=True, text=True)
+        command = ['squeue', '-u', username, '-t', 'R,PD', '-n', jobname]
+        out = subprocess.run(command, capture_output=True, text=True)
 
         if username in out.stdout:
             # Job is running, do nothing
@@ -422,13 +455,10 @@ class EnzymaticHydrolysis:
         else:
             # Job is not running, submit it
             print('Submitting EH CFD job.')
-            os.chdir(case_folder)
-            command = f'sbatch --job-name={jobname} ofoamjob'
-            out = subprocess.run(command.split(), capture_output=True, text=True)
+            command = ['sbatch', f'--job-name={jobname}', 'ofoamjob']
+            out = subprocess.run(command, cwd=case_folder, capture_output=True, text=True)
             job_id = out.stdout.strip().split()[-1]
-            with open('job_history.csv', 'a') as fp:
-                fp.write('%s\n' % (job_id))
-            os.chdir(cwd)
+            record_job_id(job_id)
             # Save ve_params to the yaml file
             self.ve.eh_out['job_id'] = job_id
             self.ve.write_to_file(os.path.join(root_path, f've_params.{job_id}'), verbose=True)
@@ -537,6 +567,10 @@ class Bioreactor:
         self.ve.br_in = {}
 
         self.br_module_path = os.path.join(root_path, 'models', 'bioreactor', 'bubble_column')
+        # Running sbatch processes as (process, EH job ID) pairs, and the
+        # submitted CFD jobs as (job ID, EH job ID) pairs once collected
+        self._sbatch_procs = []
+        self.br_jobs = []
         # Bioreactor input parameters
         if type(br_options) is dict:
             self.model_type = br_options['model_type'] # running select_run_function() inside
@@ -552,11 +586,7 @@ class Bioreactor:
             # self.column_diameter = br_options.column_diameter.value
             # self.bubble_diameter = br_options.bubble_diameter.value
             # self.t_final = br_options.t_final.value
-            for widget_name, widget in br_options.__dict__.items(): 
-                if isinstance(widget, OptimizationWidget):
-                    setattr(self, widget_name, widget.widget.value)
-                else:
-                    setattr(self, widget_name, widget.value)
+            set_widget_values(self, br_options)
 
     ##############################################
     ### Properties
@@ -568,7 +598,7 @@ class Bioreactor:
     @gas_velocity.setter
     def gas_velocity(self, a):
         if not 0.01 <= a <=0.1:
-            raise ValueError(f"Value {a} is outside allowed interval [1, 1e16]")
+            raise ValueError(f"Value {a} is outside allowed interval [0.01, 0.1]")
         self.ve.br_in['gas_velocity'] = float(a)
 
     @property
@@ -578,7 +608,7 @@ class Bioreactor:
     @column_height.setter
     def column_height(self, a):
         if not 10 <= a <= 50:
-            raise ValueError(f"Value {a} is outside allowed interval [1, 1e16]")
+            raise ValueError(f"Value {a} is outside allowed interval [10, 50]")
         self.ve.br_in['column_height'] = float(a)
 
     @property
@@ -588,7 +618,7 @@ class Bioreactor:
     @column_diameter.setter
     def column_diameter(self, a):
         if not 1 <= a <= 6:
-            raise ValueError(f"Value {a} is outside allowed interval [1, 1e16]")
+            raise ValueError(f"Value {a} is outside allowed interval [1, 6]")
         self.ve.br_in['column_diameter'] = float(a)
 
     @property
@@ -598,7 +628,7 @@ class Bioreactor:
     @bubble_diameter.setter
     def bubble_diameter(self, a):
         if not 0.003 <= a <= 0.008:
-            raise ValueError(f"Value {a} is outside allowed interval [1, 1e16]")
+            raise ValueError(f"Value {a} is outside allowed interval [0.003, 0.008]")
         self.ve.br_in['bubble_diameter'] = float(a)
 
     @property
@@ -617,7 +647,7 @@ class Bioreactor:
 
     @model_type.setter
     def model_type(self, a):
-        if not a in ['CFD Simulation', "CFD Surrogate"]:
+        if a not in self.run_functions:
             raise ValueError("Invalid value. Allowed options: 'CFD Simulation', 'CFD Surrogate'")
         self.ve.br_in['model_type'] = a
         self.select_run_function()
@@ -625,16 +655,19 @@ class Bioreactor:
     #
     ##############################################
 
+    # The run method and the module path it imports from for each model type
+    run_functions = {'CFD Simulation': ('run_biorector_cfd_simulation', None),
+                     'CFD Surrogate': ('run_biorector_cfd_surrogate',
+                                       os.path.join(root_path, 'models', 'bioreactor', 'bubble_column', 'surrogate_model'))}
+
     def select_run_function(self):
-        # selected enzymatic hydrolysis model
+        # selected bioreactor model
         if self.model_type == 'CFD Simulation':
             assert self.hpc_run, f'Cannot run bioreactor without HPC resources. \n {os.getcwd()}'
-            self.run = self.run_biorector_cfd_simulation
-        elif self.model_type == "CFD Surrogate":
-            self.run = self.run_biorector_cfd_surrogate
-            br_surrogate_path = os.path.join(self.br_module_path,'surrogate_model')
-            if not br_surrogate_path in sys.path:
-                sys.path.append(br_surrogate_path)
+        run_function, br_module_path = self.run_functions[self.model_type]
+        self.run = getattr(self, run_function)
+        if br_module_path is not None and br_module_path not in sys.path:
+            sys.path.append(br_module_path)
 
     def run_biorector_cfd_simulation(self, verbose=True):
 
@@ -697,24 +730,100 @@ class Bioreactor:
 
         jobname = 'br_cfd'
         # Run the bioreactor model
-        os.chdir(self.br_module_path)
         if np.isnan(self.ve.eh_out['rho_g']):
             print(f'Submit Bioreactor CFD job dependent on successful run of EH CFD job (job ID: {self.ve.eh_out["job_id"]}).')
-            command = f'sbatch --job-name={jobname} --dependency=afterok:{self.ve.eh_out["job_id"]} submit_reactor_and_pvbatch.sbatch'
+            eh_job_id = self.ve.eh_out['job_id']
+            command = ['sbatch', f'--job-name={jobname}', f'--dependency=afterok:{eh_job_id}',
+                       'submit_reactor_and_pvbatch.sbatch']
         else:
-            with open(os.path.join(root_path, 'EH_OpenFOAM', 'tests', 'RushtonReact', 'job_history.csv'), 'a') as fp:
-                fp.write(f'{0}\n')
+            eh_job_id = 0
+            record_job_id(eh_job_id)
             # Save ve_params to the yaml file
-            self.ve.write_to_file(os.path.join(root_path, f've_params.{0}'), verbose=True)
-            command = f'sbatch --job-name={jobname} submit_reactor_and_pvbatch.sbatch'
-        out = subprocess.run(command.split(), capture_output=True, text=True)
-        job_id = out.stdout.strip().split()[-1]
-        os.chdir(root_path)
-        
+            self.ve.write_to_file(os.path.join(root_path, f've_params.{eh_job_id}'), verbose=True)
+            command = ['sbatch', f'--job-name={jobname}', 'submit_reactor_and_pvbatch.sbatch']
+
+        # Don't wait on sbatch here, its job ID is collected by the next
+        # run, wait_for_bioreactor() or when the model is pickled
+        self._collect_sbatch_jobs(verbose)
+        proc = subprocess.Popen(command, cwd=self.br_module_path, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True)
+        self._sbatch_procs.append((proc, eh_job_id))
+
         if verbose:
-            print(f'CFD job submitted, please check the queue... Job ID: {job_id}')
+            print('CFD job submitted, call wait_for_bioreactor() to wait for the results.')
         return False
 
+    def _collect_sbatch_jobs(self, verbose=True):
+        # Wait for the sbatch submissions to return and keep their job IDs
+        while self._sbatch_procs:
+            proc, eh_job_id = self._sbatch_procs.pop(0)
+            out, err = proc.communicate()
+            if proc.returncode != 0 or not out.split():
+                raise RuntimeError(f'sbatch failed (exit code {proc.returncode}): {err.strip()}')
+            job_id = out.split()[-1]
+            self.br_jobs.append((job_id, eh_job_id))
+            if verbose:
+                print(f'CFD job submitted, please check the queue... Job ID: {job_id}')
+
+    def __getstate__(self):
+        # Processes can't be pickled, keep only the job IDs they produced
+        self._collect_sbatch_jobs(verbose=False)
+        state = self.__dict__.copy()
+        state['_sbatch_procs'] = []
+        return state
+
+    def wait_for_bioreactor(self, poll_interval=60.0, verbose=True):
+        """ Wait for all submitted bioreactor CFD jobs to leave the queue.
+
+        The job IDs of every pending submission are collected at once and
+        checked with a single ``squeue`` call per poll.  When the jobs have
+        finished, the bioreactor outputs written by the post-processing
+        script are read back into ``ve.br_out``.
+
+        :param poll_interval: (float, optional)
+            Seconds to wait between queue checks, default 60.
+        :param verbose: (bool, optional)
+            Option to show print messages, default True.
+        :return: (list) The Slurm job IDs that were waited on.
+        """
+        self._collect_sbatch_jobs(verbose=False)
+        if not self.br_jobs:
+            return []
+        # The jobs are kept in br_jobs until their results have been read,
+        # so an interrupted wait can simply be called again
+        job_ids = [job_id for job_id, _ in self.br_jobs]
+        eh_job_id = self.br_jobs[-1][1]
+
+        if verbose:
+            print(f'Waiting for CFD job(s): {", ".join(job_ids)}')
+
+        pending = list(job_ids)
+        while pending:
+            command = ['squeue', f'--jobs={",".join(pending)}', '--noheader', '--format=%i']
+            out = subprocess.run(command, capture_output=True, text=True)
+            # squeue also fails on job IDs that have left its records, any
+            # other error (e.g., a controller timeout) says nothing about the jobs
+            if out.returncode == 0 or 'Invalid job id' in out.stderr:
+                queued = out.stdout.split()
+                pending = [job_id for job_id in pending if job_id in queued]
+            elif verbose:
+                print(f'squeue failed (exit code {out.returncode}): {out.stderr.strip()}')
+            if pending:
+                time.sleep(poll_interval)
+
+        # br_postprocess_script.py writes its results next to the models
+        params_filename = os.path.join(root_path, 'models', f've_params.{eh_job_id}')
+        params = yaml_to_dict(params_filename)
+        if 'br_out' not in params:
+            raise RuntimeError(f'The bioreactor CFD job(s) {", ".join(job_ids)} finished '
+                               f'without writing br_out to {params_filename}')
+        self.ve.br_out = params['br_out']
+        self.br_jobs = []
+
+        if verbose:
+            print('Finished Bioreactor')
+        return job_ids
+
 
     def run_biorector_cfd_surrogate(self, verbose=True):
         
@@ -733,12 +842,21 @@ class Bioreactor:
                 return True
             return False
 
-def run_script(filename, *args, verbose=True):
+# Compiled scripts keyed by filename, stored with the file's mtime
+compiled_scripts = {}
+
+class NullWriter(io.TextIOBase):
+    """A text stream that discards everything written to it."""
+    def write(self, s):
+        return len(s)
+
+def run_script(filename, *args, verbose=True, silence_fd=False):
     """ Execute the contents of a file.
 
     This function will attempt to execute the contents of a file specified
     with ``filename`` using the Python ``exec`` function.  No error checking
-    is performed on the source file to be executed.
+    is performed on the source file to be executed.  The compiled source is
+    cached and only recompiled when the file's modification time changes.
 
     Args:
         filename (str):
@@ -749,6 +867,12 @@ def run_script(filename, *args, verbose=True):
         verbose (bool, optional):
             Flag to display the printed outputs
             from the executed file, defaults to ``True``.
+        silence_fd (bool, optional):
+            When ``verbose`` is ``False``, also discard anything written
+            straight to file descriptor 1, e.g., by compiled extensions,
+            defaults to ``False``.  File descriptor 1 is shared by the whole
+            process, so output from other threads is discarded too while
+            the file runs.
 
     Returns:
         None
@@ -757,17 +881,36 @@ def run_script(filename, *args, verbose=True):
 
     sys.argv = [filename]
     sys.argv.extend(args)
-    exec_file = open(filename, 'r')
+
+    mtime = os.stat(filename).st_mtime_ns
+    cached = compiled_scripts.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(filename, 'rb') as exec_file:
+            cached = (mtime, compile(exec_file.read(), filename, 'exec'))
+        compiled_scripts[filename] = cached
+    code = cached[1]
 
     if verbose:
         # Execute the file as usual
-        exec(exec_file.read(), globals())
+        exec(code, globals())
 
-    else:
-        # Execute the file, redirecting all output to devnull
-        # This suppresses any print statements within `filename`
-        with open(os.devnull, 'w') as fp:
-            with contextlib.redirect_stdout(fp):
-                exec(exec_file.read(), globals())
+    elif not silence_fd:
+        # Execute the file, sending Python prints to a null writer (no
+        # encoding or write calls). Note the print arguments are still formatted.
+        with contextlib.redirect_stdout(NullWriter()):
+            exec(code, globals())
 
-    exec_file.close()
+    else:
+        # As above, and also point file descriptor 1 at devnull for the
+        # whole process until the file has run
+        sys.stdout.flush()
+        saved_stdout_fd = os.dup(1)
+        devnull_fd = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull_fd, 1)
+        try:
+            with contextlib.redirect_stdout(NullWriter()):
+                exec(code, globals())
+        finally:
+            os.dup2(saved_stdout_fd, 1)
+            os.close(saved_stdout_fd)
+            os.close(devnull_fd)
@@ -12,11 +12,30 @@ from mpi4py import MPI
 import numpy as np
 
 import os
-from scipy.interpolate import interp1d
+import functools
 
 from Utilities import linstep, project
 
 
+@functools.lru_cache(maxsize=1)
+def _load_steam_table():
+    # The saturated steam table is static, so read it once per process and
+    # return the temperature (K) and vapor density (kg/m^3) columns
+    pt_path = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+    steam_datafile = os.path.join(pt_path, "lookup_tables", "sat_steam_table.csv")
+    steam_data = np.loadtxt(steam_datafile, delimiter=",", skiprows=1, usecols=(2, 4))
+
+    # Store each column contiguously so np.interp doesn't copy them on every call
+    temperature = np.ascontiguousarray(steam_data[:, 0])
+    density = np.ascontiguousarray(steam_data[:, 1])
+
+    # The arrays are shared by every caller, protect them from modification
+    temperature.flags.writeable = False
+    density.flags.writeable = False
+
+    return temperature, density
+
+
 class Pretreatment:
     def __init__(self, verbose, show_plots):
 
@@ -182,13 +201,8 @@ class Pretreatment:
         self.glucan_solid_fraction_0 = dolfinx.fem.Constant(self.mesh, self.glucan_solid_fraction_0)
 
         # Obtain steam concentration from lookup table and add to dictionary
-        pt_path = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
-        steam_datafile = os.path.join(pt_path, "lookup_tables", "sat_steam_table.csv")
-        steam_data = np.loadtxt(steam_datafile, delimiter=",", skiprows=1)
-
-        # build interpolator interp_steam = interp.interp1d(temp_in_K, dens_in_kg/m3)
-        interp_steam = interp1d(steam_data[:, 2], steam_data[:, 4])
-        steam_density = interp_steam(self.T_s.value)
+        table_temperature, table_density = _load_steam_table()
+        steam_density = float(np.interp(self.T_s.value, table_temperature, table_density))
 
         # Convert c_sbulk to (mol/m^3) => density (kg/m^3) / molecular weight (kg/mol)
         self.c_sbulk = steam_density / self.M_w
@@ -0,0 +1,162 @@
+import pytest
+import sys
+import os
+import pickle
+import shutil
+import subprocess
+from unittest import mock
+
+import numpy as np
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(path)
+
+
+import Models_classes
+from Models_classes import Bioreactor
+from virteng.ModelsConnection import VE_params
+from virteng.Utilities import dict_to_yaml
+
+
+class FakeSbatch:
+    """Stands in for the sbatch process, handing out consecutive job IDs."""
+    next_job_id = 101
+
+    def __init__(self, command, returncode=0, stderr='', **kwargs):
+        self.command = command
+        self.returncode = returncode
+        self.stderr = stderr
+        if returncode == 0:
+            self.stdout = f'Submitted batch job {FakeSbatch.next_job_id}\n'
+            FakeSbatch.next_job_id += 1
+        else:
+            self.stdout = ''
+
+    def communicate(self):
+        return self.stdout, self.stderr
+
+
+def squeue_result(returncode=0, stdout='', stderr=''):
+    return subprocess.CompletedProcess(args=['squeue'], returncode=returncode, stdout=stdout, stderr=stderr)
+
+
+@pytest.fixture()
+def build_bioreactor(tmp_path, monkeypatch):
+    ve = VE_params()
+    saved_state = dict(ve.__dict__)
+
+    # Work on a copy of the case so the shipped files aren't rewritten
+    br_module_path = os.path.join(Models_classes.root_path, 'models', 'bioreactor', 'bubble_column')
+    for folder in ['TEMPLATE', 'system', 'constant']:
+        shutil.copytree(os.path.join(br_module_path, folder), tmp_path / 'bubble_column' / folder)
+    os.makedirs(tmp_path / 'models')
+    monkeypatch.setattr(Models_classes, 'root_path', str(tmp_path))
+    monkeypatch.setattr(Models_classes.time, 'sleep', lambda seconds: None)
+    FakeSbatch.next_job_id = 101
+
+    br_options = {'model_type': 'CFD Surrogate',
+                  'gas_velocity': 0.08,
+                  'column_height': 40.0,
+                  'column_diameter': 5.0,
+                  'bubble_diameter': 0.006,
+                  't_final': 100.0}
+    BR_model = Bioreactor(br_options, hpc_run=False)
+    BR_model.br_module_path = str(tmp_path / 'bubble_column')
+
+    # The EH CFD job (ID 42) is still running, so the bioreactor job depends on it
+    BR_model.ve.eh_out = {'rho_g': np.nan, 'job_id': 42}
+
+    yield BR_model
+
+    ve.__dict__.clear()
+    ve.__dict__.update(saved_state)
+
+
+@pytest.mark.unit
+def test_sbatch_failure(build_bioreactor):
+    BR_model = build_bioreactor
+
+    def failing_sbatch(command, **kwargs):
+        return FakeSbatch(command, returncode=1, stderr='sbatch: error: Invalid account\n')
+
+    with mock.patch('Models_classes.subprocess.Popen', side_effect=failing_sbatch):
+        BR_model.run_biorector_cfd_simulation(verbose=False)
+
+        with pytest.raises(RuntimeError, match='Invalid account'):
+            BR_model.wait_for_bioreactor(verbose=False)
+
+
+@pytest.mark.unit
+def test_getstate_keeps_job_ids(build_bioreactor):
+    BR_model = build_bioreactor
+
+    with mock.patch('Models_classes.subprocess.Popen', side_effect=FakeSbatch) as popen:
+        BR_model.run_biorector_cfd_simulation(verbose=False)
+
+    assert '--dependency=afterok:42' in popen.call_args.args[0]
+
+    BR_model_copy = pickle.loads(pickle.dumps(BR_model))
+
+    assert BR_model_copy._sbatch_procs == []
+    assert BR_model_copy.br_jobs == [('101', 42)]
+
+
+@pytest.mark.unit
+def test_wait_for_bioreactor(build_bioreactor):
+    BR_model = build_bioreactor
+
+    with mock.patch('Models_classes.subprocess.Popen', side_effect=FakeSbatch):
+        BR_model.run_biorector_cfd_simulation(verbose=False)
+        BR_model.run_biorector_cfd_simulation(verbose=False)
+
+    # What br_postprocess_script.py writes once the jobs have finished
+    dict_to_yaml({'br_out': {'our': 68.6}}, os.path.join(Models_classes.root_path, 'models', 've_params.42'))
+
+    # A controller timeout doesn't count as the jobs having finished
+    squeue_results = [squeue_result(returncode=1, stderr='slurm_load_jobs error: Socket timed out\n'),
+                      squeue_result(stdout='101\n102\n'),
+                      squeue_result(stdout='102\n'),
+                      squeue_result(returncode=1, stderr='slurm_load_jobs error: Invalid job id specified\n')]
+
+    with mock.patch('Models_classes.subprocess.run', side_effect=squeue_results) as run:
+        job_ids = BR_model.wait_for_bioreactor(verbose=False)
+
+    assert job_ids == ['101', '102']
+    assert [call.args[0][1] for call in run.call_args_list] == ['--jobs=101,102', '--jobs=101,102',
+                                                                '--jobs=101,102', '--jobs=102']
+    assert BR_model.ve.br_out == {'our': 68.6}
+    assert BR_model.br_jobs == []
+
+
+@pytest.mark.unit
+def test_wait_for_bioreactor_interrupted(build_bioreactor, monkeypatch):
+    BR_model = build_bioreactor
+
+    with mock.patch('Models_classes.subprocess.Popen', side_effect=FakeSbatch):
+        BR_model.run_biorector_cfd_simulation(verbose=False)
+
+    def interrupt(seconds):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(Models_classes.time, 'sleep', interrupt)
+
+    with mock.patch('Models_classes.subprocess.run', return_value=squeue_result(stdout='101\n')):
+        with pytest.raises(KeyboardInterrupt):
+            BR_model.wait_for_bioreactor(verbose=False)
+
+    # The job can still be waited on after the interruption
+    assert BR_model.br_jobs == [('101', 42)]
+
+
+@pytest.mark.unit
+def test_wait_for_bioreactor_missing_output(build_bioreactor):
+    BR_model = build_bioreactor
+
+    with mock.patch('Models_classes.subprocess.Popen', side_effect=FakeSbatch):
+        BR_model.run_biorector_cfd_simulation(verbose=False)
+
+    dict_to_yaml({'eh_out': {'rho_g': 1.0}}, os.path.join(Models_classes.root_path, 'models', 've_params.42'))
+
+    with mock.patch('Models_classes.subprocess.run', return_value=squeue_result()):
+        with pytest.raises(RuntimeError, match='without writing br_out'):
+            BR_model.wait_for_bioreactor(verbose=False)
@@ -0,0 +1,48 @@
+import pytest
+import sys
+import os
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(path)
+
+
+from Models_classes import read_eh_times, eh_case_folder, EH_TIME_DEFAULTS
+
+eh_properties_filename = os.path.join(eh_case_folder, 'constant', 'EHProperties')
+
+
+@pytest.mark.unit
+def test_read_eh_times():
+    eh_times = read_eh_times(eh_properties_filename)
+
+    truth_values = {'reaction_update_time': 1.0,
+                    'fluid_update_time': 250.0,
+                    'fluid_steadystate_time': 400.0}
+
+    assert eh_times == truth_values
+
+
+@pytest.mark.unit
+def test_read_eh_times_comments_and_defaults(tmp_path):
+    with open(eh_properties_filename) as fp:
+        lines = fp.readlines()
+
+    edited_lines = []
+    for line in lines:
+        if line.startswith('fluid_update_time'):
+            # Only the uncommented entry is used
+            edited_lines.append('// fluid_update_time    ft  [0 0 1 0 0 0 0] 999.0; //seconds\n')
+            edited_lines.append('/* fluid_update_time    ft  [0 0 1 0 0 0 0] 888.0; */\n')
+            edited_lines.append(line.replace('250.0', '300.0'))
+        elif not line.startswith('fluid_steadystate_time'):
+            edited_lines.append(line)
+
+    edited_filename = tmp_path / 'EHProperties'
+    edited_filename.write_text(''.join(edited_lines))
+
+    eh_times = read_eh_times(str(edited_filename))
+
+    assert eh_times['reaction_update_time'] == 1.0
+    assert eh_times['fluid_update_time'] == 300.0
+    # The missing entry falls back to its default
+    assert eh_times['fluid_steadystate_time'] == EH_TIME_DEFAULTS['fluid_steadystate_time']
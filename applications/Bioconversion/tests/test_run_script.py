@@ -0,0 +1,76 @@
+import pytest
+import sys
+import os
+import builtins
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(path)
+
+
+import Models_classes
+from Models_classes import run_script
+
+script_source = '''
+import os
+print('python output')
+os.write(1, b'fd output\\n')
+'''
+
+
+@pytest.fixture()
+def build_script(tmp_path):
+    script = tmp_path / 'script.py'
+    script.write_text(script_source)
+
+    return str(script)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('silence_fd', [True, False])
+def test_run_script_quiet(build_script, capfd, silence_fd):
+    run_script(build_script, verbose=False, silence_fd=silence_fd)
+    out, _ = capfd.readouterr()
+
+    assert 'python output' not in out
+    assert ('fd output' in out) is not silence_fd
+
+    # Both kinds of output reach stdout again once the script has run
+    print('python after')
+    os.write(1, b'fd after\n')
+    out, _ = capfd.readouterr()
+
+    assert 'python after' in out
+    assert 'fd after' in out
+
+
+@pytest.mark.unit
+def test_run_script_verbose(build_script, capfd):
+    run_script(build_script)
+    out, _ = capfd.readouterr()
+
+    assert 'python output' in out
+    assert 'fd output' in out
+
+
+@pytest.mark.unit
+def test_run_script_compile_cache(build_script, monkeypatch):
+    n_compiles = []
+    builtin_compile = builtins.compile
+    def counting_compile(*args, **kwargs):
+        n_compiles.append(args[1])
+        return builtin_compile(*args, **kwargs)
+
+    monkeypatch.setattr(Models_classes, 'compiled_scripts', {})
+    monkeypatch.setattr(builtins, 'compile', counting_compile)
+
+    run_script(build_script, verbose=False)
+    run_script(build_script, verbose=False)
+
+    # An unchanged file is only compiled once
+    assert n_compiles == [build_script]
+
+    st = os.stat(build_script)
+    os.utime(build_script, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    run_script(build_script, verbose=False)
+
+    assert n_compiles == [build_script, build_script]
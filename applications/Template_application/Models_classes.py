@@ -90,12 +90,11 @@ class Model1:
             from model1 import run_model1
             self.ve.model1_out = run_model1(self.ve) 
         else:
-            os.chdir(self.model1_module_path)
-            self.ve.write_to_file('ve_params.yml')
-            command = 'python run_model1.py'
-            subprocess.call(command.split(), text=True)
-            self.ve = VE_params.load_from_file('ve_params.yml', verbose=False)
-            os.chdir(root_path)
+            params_filename = os.path.join(self.model1_module_path, 've_params.yml')
+            self.ve.write_to_file(params_filename)
+            command = ['python', 'run_model1.py']
+            subprocess.call(command, cwd=self.model1_module_path, text=True)
+            self.ve = VE_params.load_from_file(params_filename, verbose=False)
         
         if check_dict_for_nans(self.ve.model1_out):
             return True
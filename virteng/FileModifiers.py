@@ -17,6 +17,8 @@ def write_file_with_replacements(filename, replacements, full_overwrite=False):
     would be the intended target for ``{"t_final": 25.0}`` to halve the variable
     value.  It will preserve the assignment operator for "=", ":", and " " 
     characters, where the last pattern represents any number of blank spaces.
+    If the modified contents match the existing file, the file is left untouched
+    so that its modification time only changes when its values do.
     
     Args:
         filename (str):
@@ -58,8 +60,8 @@ def write_file_with_replacements(filename, replacements, full_overwrite=False):
         copyfile(filename, backup_filename)
         f_read = open(backup_filename, 'r')
 
-    # Create a separate pointer for reading and writing
-    f_write = open(filename, 'w')
+    # Build the modified contents in memory before touching the original file
+    new_lines = []
 
     for line in f_read:
 
@@ -107,9 +109,17 @@ def write_file_with_replacements(filename, replacements, full_overwrite=False):
             # Replace the current line with the modified line
             line = new_line
 
-        # Write the (possibly modified) line into the new file    
-        f_write.write(line)
+        # Store the (possibly modified) line for the new file
+        new_lines.append(line)
 
-    # Close both files when finished
     f_read.close()
-    f_write.close()
+
+    new_contents = ''.join(new_lines)
+
+    # Skip the write if the file already holds exactly these contents
+    with open(filename, 'r') as f_current:
+        if f_current.read() == new_contents:
+            return
+
+    with open(filename, 'w') as f_write:
+        f_write.write(new_contents)
@@ -1,5 +1,5 @@
 # import sys
-# import os
+import os
 # import contextlib
 # import subprocess
 # import numpy as np
@@ -23,6 +23,11 @@ class VE_params(object):
     def __init__(self):
         self.__dict__ = self.__shared_state
 
+    def __setstate__(self, state):
+        # Unpickled instances (e.g., in a worker process) rejoin the shared state
+        self.__dict__ = self.__shared_state
+        self.__dict__.update(state)
+
     @classmethod
     def load_from_file(cls, yaml_filename, verbose=False):
         ve = cls()
@@ -31,6 +36,11 @@ class VE_params(object):
         return ve
 
     def write_to_file(self, yaml_filename, merge_with_existing=False, verbose=False):
+        if not merge_with_existing:
+            # Nothing to do if the file already holds exactly these parameters,
+            # an unchanged file is served from the yaml_to_dict cache
+            if os.path.exists(yaml_filename) and yaml_to_dict(yaml_filename) == self.__dict__:
+                return
         dict_to_yaml(self.__dict__,  yaml_filename, merge_with_existing, verbose)
     
     def __str__(self):
@@ -1,20 +1,44 @@
 
-# import os
+import os
 import sys
+import logging
+import pickle
+import shutil
+import tempfile
+import time
+import warnings
 import scipy.optimize as opt
 import numpy as np
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 # imports from vebio modules
 from virteng.WidgetFunctions import OptimizationWidget
-# from vebio.Utilities import  yaml_to_dict
 from virteng.ModelsConnection import VE_params
+from virteng.Utilities import pushd
 # # add path for no-CFD EH model
 # sys.path.append(os.path.join(notebookDir, "submodules/CEH_EmpiricalModel/"))
 
+log = logging.getLogger(__name__)
+
+
+def _scale_back_kernel(x, lb, span, out):
+    for i in range(x.size):
+        out[i] = x[i]*span[i] + lb[i]
+
+# Compile the scaling kernel when Numba is available, otherwise it runs as plain Python
+if numba is not None:
+    _scale_back_kernel = numba.njit(cache=True)(_scale_back_kernel)
+
+
 class Optimization:
 
     def __init__(self, case_folder,  options_list, obj_widjet, hpc_run):
 
+        self.case_folder = case_folder
         sys.path.append(case_folder)
         from Models_classes import make_models_list, make_output_names
 
@@ -33,6 +57,26 @@ class Optimization:
 
         self.fn_evals = 0
         self.objective_scaling = 1.0
+
+        # Memoized objective values keyed on the (rounded) scaled controls and
+        # the most recent model-chain evaluation, so repeated points requested
+        # by the optimizer don't rerun the models
+        self._obj_cache = {}
+        self._last_dv = None
+        self._last_obj = None
+
+        # Results file handle, open for the duration of scipy_minimize
+        self._results_fp = None
+
+        # Step size for the finite-difference Jacobian in scaled [0, 1] units,
+        # kept well above round-off so surrogate noise doesn't swamp the gradient
+        self.fd_step = 1.0e-4
+
+        # Whether model chains may run concurrently in worker processes. On HPC
+        # the models exchange data through files at fixed absolute paths (the
+        # ve_params.yml handed to subprocesses, the OpenFOAM case folders), so
+        # concurrent runs would overwrite each other's inputs and outputs.
+        self.parallel_runs = not hpc_run
         
         # Find variable to be optimized and set initial values and bounds 
         self.x_0 = []
@@ -59,6 +103,19 @@ class Optimization:
         if len(self.x_0) == 0:
             raise ValueError('No controls have been specified, retry with >= 1 control variables.')
 
+        # Lower bounds and ranges of the controls for vectorized scaling
+        self._lb = np.array([bounds[0] for bounds in self.var_real_bounds])
+        self._span = np.array([bounds[1] - bounds[0] for bounds in self.var_real_bounds])
+
+        # Use the (Numba-compiled) scaling kernel instead of NumPy. This only
+        # pays off when the models are cheap enough that the Python overhead of
+        # each evaluation matters more than the one-time JIT compilation.
+        self.use_jit = False
+
+        # The models that take each control, fixed once the models are built
+        self._var_targets = [(var_name, [model for model in self.models_list if hasattr(model, var_name)])
+                             for var_name in self.var_names]
+
     @staticmethod
     def normalize(value, bounds):
         lb, ub = bounds
@@ -69,19 +126,178 @@ class Optimization:
         lb, ub = bounds
         return value*(ub-lb) + lb
 
-    def scipy_minimize(self, objective_fn, method='SLSQP', opt_results_file='optimization_results.csv'):
-        self.opt_results_file = opt_results_file
-        # Write header for the outputfile
-        with open(self.opt_results_file, 'w') as fp:
-            fp.write('# Iteration, ')
-            for control in self.nice_var_names:
-                fp.write('%s, ' % (control))
-            fp.write('Objective\n')
-        # Minimization
-        self.opt_result = opt.minimize(objective_fn, self.x_0, method=method,
-                                       bounds=self.var_bounds, callback=self.opt_callback)
+    # Default solver options for each supported method. The controls only
+    # have box bounds, so L-BFGS-B is the default; COBYLA needs no gradient
+    # and runs a single model chain per iteration. Its initial step is kept
+    # well inside the scaled [0, 1] box so its first trial points aren't
+    # clipped onto the bounds.
+    method_options = {'L-BFGS-B': {'maxfun': 200},
+                      'SLSQP': {},
+                      'COBYLA': {'rhobeg': 0.25}}
+    # Methods that use a gradient and accept the ftol option
+    gradient_methods = ('L-BFGS-B', 'SLSQP')
+
+    def scipy_minimize(self, objective_fn, method='L-BFGS-B', opt_results_file='optimization_results.csv', options=None,
+                       resume=False, verbose=True, maxiter=50, ftol=1.0e-6, wallclock_budget_s=None,
+                       stall_iterations=None):
+        """ Minimize the objective with ``scipy.optimize.minimize``.
+
+        :param objective_fn: The objective function, usually ``self.objective_function``
+        :param method: (str) The minimization method, defaults to 'L-BFGS-B'
+        :param opt_results_file: The filename to write the evaluations to,
+                                 defaults to 'optimization_results.csv'
+        :param options: (dict) Solver options, defaults to ``method_options[method]``
+        :param resume: (bool) Reuse the evaluations already in ``opt_results_file``
+                       so points visited by an interrupted run are not rerun,
+                       defaults to False
+        :param verbose: (bool) Report every objective evaluation, defaults to True
+        :param maxiter: (int) The maximum number of iterations, defaults to 50
+        :param ftol: (float) The relative objective tolerance used both by the
+                     solver (where supported) and to detect stalled progress,
+                     defaults to 1e-6
+        :param wallclock_budget_s: (float) Stop after the iteration that exceeds
+                                   this many seconds, defaults to None (no limit)
+        :param stall_iterations: (int) Stop if the best objective hasn't improved
+                                 by more than ``ftol`` in this many iterations,
+                                 defaults to None (never)
+        """
+        _set_log_verbosity(verbose)
+        if options is None:
+            options = dict(self.method_options.get(method, {}))
+            options['maxiter'] = maxiter
+            if method in self.gradient_methods:
+                options['ftol'] = ftol
+
+        # Early-stopping state checked by opt_callback
+        self._ftol = ftol
+        self._wallclock_budget_s = wallclock_budget_s
+        self._stall_iterations = stall_iterations
+        self._best_iterate_obj = None
+        self._n_stalled = 0
+        self._t0 = time.perf_counter()
+        # Derivative-free methods don't take a Jacobian
+        jac = self._parallel_jac if method in self.gradient_methods else None
+
+        self._open_results_file(opt_results_file, resume)
+        try:
+            # Minimization
+            self.opt_result = opt.minimize(objective_fn, self.x_0, method=method, jac=jac,
+                                           bounds=self.var_bounds, callback=self.opt_callback,
+                                           options=options)
+        finally:
+            self._results_fp.close()
+            self._results_fp = None
+
+        self._store_best()
         return self.opt_result
 
+    def skopt_minimize(self, n_calls=40, n_parallel=4, opt_results_file='optimization_results.csv',
+                       resume=False, checkpoint_file='skopt_checkpoint.pkl', verbose=True):
+        """ Minimize the objective with Bayesian optimization (scikit-optimize).
+
+        A Gaussian-process surrogate of the objective picks ``n_parallel``
+        candidate points at a time, which are evaluated concurrently. This
+        typically needs far fewer model runs than a gradient-based method.
+        The optimizer is pickled to ``checkpoint_file`` after every iteration.
+
+        :param n_calls: (int) The approximate budget of objective evaluations,
+                        defaults to 40
+        :param n_parallel: (int) The number of points evaluated concurrently
+                           per iteration, defaults to 4
+        :param opt_results_file: The filename to write the evaluations to,
+                                 defaults to 'optimization_results.csv'
+        :param resume: (bool) Continue from ``checkpoint_file`` if it exists,
+                       otherwise from the evaluations in ``opt_results_file``,
+                       defaults to False
+        :param checkpoint_file: The filename of the pickled optimizer,
+                                defaults to 'skopt_checkpoint.pkl'
+        :param verbose: (bool) Report every objective evaluation, defaults to True
+        """
+        _set_log_verbosity(verbose)
+        from skopt import Optimizer
+        from skopt.space import Real
+
+        prior_xs, prior_ys = self._open_results_file(opt_results_file, resume)
+        try:
+            if resume and os.path.exists(checkpoint_file):
+                with open(checkpoint_file, 'rb') as fp:
+                    optimizer = pickle.load(fp)
+            else:
+                optimizer = Optimizer(dimensions=[Real(0.0, 1.0)]*len(self.x_0), base_estimator='gp', acq_func='EI')
+                if len(prior_xs) > 0:
+                    optimizer.tell(prior_xs, [y*self.objective_scaling for y in prior_ys])
+                else:
+                    # Start from the initial guess, this also sets the objective scaling
+                    optimizer.tell(list(self.x_0), self.objective_function(self.x_0))
+
+            while self.fn_evals < n_calls:
+                xs = optimizer.ask(n_points=n_parallel)
+                ys = self._parallel_objective(xs)
+                optimizer.tell(xs, ys)
+                with open(checkpoint_file, 'wb') as fp:
+                    pickle.dump(optimizer, fp)
+        finally:
+            self._results_fp.close()
+            self._results_fp = None
+
+        self.opt_result = optimizer.get_result()
+
+        self._store_best()
+        return self.opt_result
+
+    def _store_best(self):
+        # Keep the optimum from the solver result so it doesn't need rerunning
+        self.best_x_scaled = np.asarray(self.opt_result.x, dtype=float)
+        self.best_x_dim = self._dimensional_values(self.best_x_scaled)
+        self.best_obj = -self.opt_result.fun/self.objective_scaling
+
+    def get_best(self):
+        """ Return the best controls and objective found by the last minimization.
+
+        Returns:
+            tuple(dict, float):
+                The dimensional value of each control keyed by its name, and
+                the (unscaled) objective value at that point.
+        """
+        return dict(zip(self.var_names, self.best_x_dim)), self.best_obj
+
+    def _open_results_file(self, opt_results_file, resume):
+        """ Open the results file for the duration of a minimization.
+
+        When resuming from an existing file, its evaluations are loaded into
+        the objective cache and new rows are appended to it.
+
+        Returns:
+            The scaled controls and (unscaled) objective values read from the file.
+        """
+        self.opt_results_file = opt_results_file
+
+        prior_xs, prior_ys = [], []
+        if resume and os.path.exists(opt_results_file):
+            data = np.loadtxt(opt_results_file, delimiter=',', ndmin=2)
+            for row in data:
+                # Points on a bound don't always round-trip exactly through
+                # the dimensional values in the file
+                x = np.clip((row[1:-1] - self._lb)/self._span, 0.0, 1.0)
+                obj = row[-1]
+                if self.fn_evals == 0:
+                    self.objective_scaling = -1.0/obj
+                self.fn_evals += 1
+                self._obj_cache[tuple(np.round(x, 12))] = obj
+                prior_xs.append(list(x))
+                prior_ys.append(obj)
+            log.info('Resuming from %d evaluations in %s.', len(prior_ys), opt_results_file)
+
+        # Keep the outputfile open (line buffered) for the whole minimization
+        if len(prior_ys) > 0:
+            self._results_fp = open(opt_results_file, 'a', buffering=1)
+        else:
+            self._results_fp = open(opt_results_file, 'w', buffering=1)
+            # Write header for the outputfile
+            self._results_fp.write('# Iteration, ' + ''.join(f'{control}, ' for control in self.nice_var_names) + 'Objective\n')
+
+        return prior_xs, prior_ys
+
     def define_n_models(self):
         if self.output_name not in self.output_names:
             raise ValueError(f"Error: Output dictionary '{self.output_name}' doesn't exist. Check the widget definition")
@@ -91,100 +307,244 @@ class Optimization:
         return n
 
     def run_models_with_new_values(self, dimensional_values, verbose=False):
+        # Skip the model chain if these are the values we just ran
+        if self._last_dv is not None and np.array_equal(self._last_dv, dimensional_values):
+            return self._last_obj
+
         # Update the models with the latest values
-        for var_name, value in zip(self.var_names, dimensional_values):
-            for model in self.models_list:
-                if hasattr(model, var_name):
-                    setattr(model, var_name, value)
-                    
+        for (var_name, targets), value in zip(self._var_targets, dimensional_values):
+            for model in targets:
+                setattr(model, var_name, value)
+
         # Run models
         for model in self.models_list:
             flag_nan = model.run(verbose=verbose)
             if flag_nan:
                 return np.nan
-        # Read the outputs into a dictionary
+        # Read the objective from the shared in-memory parameters; the models
+        # update self.ve directly, so there's no params file to parse here
         obj = getattr(self.ve, self.output_name)[self.objective_name]
+
+        self._last_dv = np.array(dimensional_values, dtype=float)
+        self._last_obj = obj
         return obj
 
     def objective_function(self, free_variables):
-        
+
+        # Keep the controls inside their bounds, some optimizers can overshoot
+        # them slightly and the models would silently accept the values
+        x = np.clip(np.asarray(free_variables, dtype=float), 0.0, 1.0)
+        if np.any(x != free_variables):
+            warnings.warn(f'Optimizer proposed an out-of-bounds point; clipped by {np.max(np.abs(x - free_variables)):.2e}')
+
+        # Return the stored value if this point has already been evaluated
+        key = tuple(np.round(x, 12))
+        if key in self._obj_cache:
+            return self._obj_cache[key] * self.objective_scaling
+
         # Scale back to dimensional values
-        dimensional_values = []
-        for value, bounds in zip(free_variables, self.var_real_bounds):
-            dimensional_values.append(self.scale_back(value, bounds))
-        # print('dimensional_values:', dimensional_values)
+        dimensional_values = self._dimensional_values(x)
+        log.debug('dimensional_values: %s', dimensional_values)
 
         # We take the negative so the minimize function sees the correct orientation
         obj = -self.run_models_with_new_values(dimensional_values, verbose=False)        
 
+        self._record_evaluation(key, dimensional_values, obj)
+
+        obj *= self.objective_scaling
+        log.debug('Scaled objective: %s', obj)
+        
+        return obj
+
+    def _dimensional_values(self, free_variables):
+        x = np.asarray(free_variables, dtype=float)
+        if self.use_jit:
+            dimensional_values = np.empty_like(x)
+            _scale_back_kernel(x, self._lb, self._span, dimensional_values)
+            return dimensional_values
+        return x * self._span + self._lb
+
+    def _record_evaluation(self, key, dimensional_values, obj):
         # Set objactive scaling to normalize objective function to -1 before iterations 
         if self.fn_evals == 0:
-            print('\nBeginning Optimization')
-            print('objective scaling:', self.objective_scaling)
             self.objective_scaling = -1.0/obj
-            
+            log.info('\nBeginning Optimization')
+            log.info('objective scaling: %s', self.objective_scaling)
+
         self.fn_evals += 1
         
         # Write iteration in the file
-        with open(self.opt_results_file, 'a') as fp:
-            fp.write('%d, ' % (self.fn_evals))
-            for dv in dimensional_values:
-                fp.write('%.15e, ' % (dv))
-            fp.write('%.15e\n' % (obj))
-
-        print('Iter = %3d: ' % (self.fn_evals), end='')
-        for k, dv in enumerate(dimensional_values):
-            print('%s = %12.9e, ' % (self.var_names[k], dv), end='')
-        print('Objective = %12.9e' % (-obj))
-        
-        obj *= self.objective_scaling
-        # print(f'Scaled objective: {obj}')
-        
-        return obj
+        if self._results_fp is not None:
+            self._results_fp.write(f'{self.fn_evals}, ' + ''.join(f'{dv:.15e}, ' for dv in dimensional_values) + f'{obj:.15e}\n')
 
-    @staticmethod
-    def opt_callback(free_variables):
-        pass
-        # print('Controls:', free_variables)
+        if log.isEnabledFor(logging.INFO):
+            controls = ''.join('%s = %12.9e, ' % (name, dv) for name, dv in zip(self.var_names, dimensional_values))
+            log.info('Iter = %3d: %sObjective = %12.9e', self.fn_evals, controls, -obj)
+
+        self._obj_cache[key] = obj
+
+    def __getstate__(self):
+        # Open file handles stay with the parent process when pickled for workers
+        state = self.__dict__.copy()
+        state['_results_fp'] = None
+        return state
+
+    def _parallel_jac(self, free_variables):
+        """ Finite-difference gradient of the objective with the perturbed
+        points evaluated concurrently, one worker process per control.
+
+        Forward differences are used unless the step would leave the [0, 1]
+        bounds, in which case a backward difference is taken instead.
+        """
+        x = np.asarray(free_variables, dtype=float)
+        f_0 = self.objective_function(x)
+
+        steps = np.where(x + self.fd_step <= 1.0, self.fd_step, -self.fd_step)
+        perturbed = [x + h*e for h, e in zip(steps, np.eye(len(x)))]
+
+        f = np.array(self._parallel_objective(perturbed))
+        return (f - f_0)/steps
+
+    def _parallel_objective(self, points):
+        """ Scaled objective values at several points, with the points that
+        haven't been evaluated yet run concurrently in worker processes.
+        The points are evaluated one after another if ``parallel_runs`` is False.
+        """
+        if not self.parallel_runs:
+            return [self.objective_function(xi) for xi in points]
+
+        pending = {}
+        for xi in points:
+            key = tuple(np.round(xi, 12))
+            if key not in self._obj_cache:
+                pending[key] = np.asarray(xi, dtype=float)
+
+        if len(pending) > 0:
+            from joblib import Parallel, delayed
+            opt_state = pickle.dumps(self)
+            values = Parallel(n_jobs=len(pending))(
+                delayed(_run_models_in_tempdir)(self.case_folder, opt_state, self._dimensional_values(xi))
+                for xi in pending.values())
+            for (key, xi), value in zip(pending.items(), values):
+                self._record_evaluation(key, self._dimensional_values(xi), -value)
 
+        return [self.objective_function(xi) for xi in points]
 
-    def parameter_grid_sweep(self, nn, results_file='sweep_params.cvs', verbose=False):
+    def opt_callback(self, free_variables):
+        """ Stop the minimization early if it runs out of wall-clock time or
+        the objective has stopped improving. Raising ``StopIteration`` from
+        the callback makes SciPy return the current iterate.
+        """
+        elapsed = time.perf_counter() - self._t0
+        if self._wallclock_budget_s is not None and elapsed > self._wallclock_budget_s:
+            log.warning('Stopping: wall-clock budget of %g s exceeded (%.1f s).', self._wallclock_budget_s, elapsed)
+            raise StopIteration
+
+        # The iterate has already been evaluated, so this is a cache lookup
+        obj = self.objective_function(free_variables)
+        if (self._best_iterate_obj is None or
+                obj < self._best_iterate_obj - self._ftol*max(abs(self._best_iterate_obj), 1.0)):
+            self._best_iterate_obj = obj
+            self._n_stalled = 0
+        else:
+            self._n_stalled += 1
+
+        if self._stall_iterations is not None and self._n_stalled >= self._stall_iterations:
+            log.warning('Stopping: no improvement in the last %d iterations.', self._n_stalled)
+            raise StopIteration
+
+
+    def parameter_grid_sweep(self, nn, results_file='sweep_params.cvs', verbose=False, n_jobs=None):
         """ Sample input parameters on a grid and run simulations.
 
+        The grid points are independent, so they are evaluated in parallel
+        worker processes and written to ``results_file`` in grid order.
+        If the model runs can't be isolated from each other (``parallel_runs``
+        is False, e.g., on HPC) they are run one after another instead.
+
         :param nn: (int) The number of points to select across each value
         :param results_file: The filename to write sweep results including 
                              extension, defaults to 'sweep_params.cvs'
+        :param n_jobs: (int) The number of worker processes, defaults to None
+                       (all available cores, or 1 if ``parallel_runs`` is False)
         """
-        
-        with open(results_file, 'w') as fp:
-            str_names = ''
-            for name in self.nice_var_names:
-                str_names += name + ', '  
-            fp.write(f'# Iteration, {str_names}{self.objective_name}\n')
-        
+        if n_jobs is None:
+            n_jobs = -1 if self.parallel_runs else 1
+        elif n_jobs != 1 and not self.parallel_runs:
+            warnings.warn('The model runs share files and cannot run concurrently; running the sweep serially.')
+            n_jobs = 1
+
         # Make parameter grid
         def uniform_grid(bounds, nn):
             C_tmp = np.linspace(bounds[0], bounds[1], nn + 1)
             return C_tmp[:-1] + (C_tmp[1] - C_tmp[0]) / 2
 
         grid_x = [uniform_grid(bounds, nn) for bounds in self.var_real_bounds]
-        grid_mesh = np.meshgrid(*grid_x, indexing='ij')
         dimension = len(self.var_names)
-        grid_ravel = np.empty((dimension, nn**dimension))
-        for i in range(dimension):
-            grid_ravel[i] = grid_mesh[i].ravel() 
-        
-        for i, dimensional_values in enumerate(grid_ravel.T):
-            # print(f'Iteration #{i+1}, parameter values: {dimensional_values}')
-            # Run models 
-            obj = self.run_models_with_new_values(dimensional_values, verbose=verbose)
-            # Write output
-            with open(results_file, 'a') as fp:
-                str_values = ''
-                for value in dimensional_values:
-                    str_values += f'{value:.9e}' + ', '  
-                fp.write(f'{(i+1):.0f}, {str_values}{obj:.9e}\n')
+
+        # Generate the grid points one at a time (in the same order as a
+        # raveled 'ij' meshgrid) rather than holding the full grid in memory
+        def grid_points():
+            for idx in np.ndindex(*([nn]*dimension)):
+                yield np.fromiter((grid_x[k][idx[k]] for k in range(dimension)),
+                                  dtype=np.float64, count=dimension)
+
+        # Run models
+        if n_jobs == 1:
+            results = [self.run_models_with_new_values(dimensional_values, verbose=verbose)
+                       for dimensional_values in grid_points()]
+        else:
+            from joblib import Parallel, delayed
+            opt_state = pickle.dumps(self)
+            results = Parallel(n_jobs=n_jobs, backend='loky')(
+                delayed(_run_models_in_tempdir)(self.case_folder, opt_state, dimensional_values, verbose)
+                for dimensional_values in grid_points())
+
+        # Write output
+        out = np.empty((nn**dimension, dimension + 2))
+        for i, (dimensional_values, obj) in enumerate(zip(grid_points(), results)):
+            out[i, 0] = i + 1
+            out[i, 1:-1] = dimensional_values
+            out[i, -1] = obj
+
+        header = 'Iteration, ' + ''.join(f'{name}, ' for name in self.nice_var_names) + self.objective_name
+        np.savetxt(results_file, out, fmt=['%d'] + ['%.9e']*(dimension + 1), delimiter=', ',
+                   header=header, comments='# ')
         
-        print(f'Finished {nn**2} forward runs.')
+        print(f'Finished {nn**dimension} forward runs.')
         
         print('\nFinished sweeps!')
+
+
+def _set_log_verbosity(verbose):
+    # Send the iteration reports to stdout (e.g., the notebook) unless the
+    # application has configured handlers, here or on a parent logger, that
+    # would already print them
+    if not log.hasHandlers():
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        log.addHandler(handler)
+    log.setLevel(logging.INFO if verbose else logging.WARNING)
+
+
+def _run_models_in_tempdir(case_folder, opt_state, dimensional_values, verbose=False):
+    """ Run the model chain of a pickled ``Optimization`` in a worker process.
+
+    The worker works from its own temporary directory so any files the
+    models write relative to the current directory don't collide with
+    other workers. Files the models write at absolute paths are not
+    isolated, which is why workers are only used when ``parallel_runs``
+    is True.
+    """
+    if case_folder not in sys.path:
+        sys.path.append(case_folder)
+    Opt = pickle.loads(opt_state)
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        with pushd(work_dir):
+            obj = Opt.run_models_with_new_values(dimensional_values, verbose=verbose)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return obj
@@ -1,7 +1,18 @@
 import os
+import copy
+import contextlib
 import yaml
 import numpy as np
 
+# Prefer the libyaml-backed C loader/dumper, falling back to pure Python
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+# Parsed YAML files keyed by absolute path, stored with the file's (mtime, size)
+_yaml_cache = {}
+
 def get_host_computer():
     """ Check if environment is running on the HPC.
 
@@ -35,6 +46,34 @@ def get_host_computer():
     return hpc_run
 
 
+@contextlib.contextmanager
+def pushd(path):
+    """ Temporarily change the working directory.
+
+    This context manager changes into ``path`` on entry and always returns
+    to the previous working directory on exit, even if an exception is
+    raised inside the ``with`` block, for example::
+
+        with pushd(case_folder):
+            subprocess.run(['sbatch', 'ofoamjob'])
+
+    Args:
+        path (str):
+            The directory to work from inside the ``with`` block.
+
+    Returns:
+        None
+
+    """
+
+    saved_path = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(saved_path)
+
+
 def print_dict(dict_to_print, indent=0):
     """ Neatly print a dictionary with indentation for nesting.
 
@@ -133,8 +172,10 @@ def dict_to_yaml(dictionary_to_write, yaml_filename, merge_with_existing=False,
         print_dict(dictionary_to_write)
         print('To the File: %s\n' % (yaml_filename))
 
+    _yaml_cache.pop(os.path.abspath(yaml_filename), None)
+
     with open(yaml_filename, 'w') as fp:
-        yaml.dump(dictionary_to_write, fp, sort_keys=False)
+        yaml.dump(dictionary_to_write, fp, Dumper=SafeDumper, sort_keys=False)
 
 
 def yaml_to_dict(yaml_filename, verbose=False):
@@ -142,7 +183,9 @@ def yaml_to_dict(yaml_filename, verbose=False):
 
     This function reads an input YAML file and stores the contents
     as a Python dictionary, where all necessary relationships and 
-    keynames are preserved as shown in the YAML file.
+    keynames are preserved as shown in the YAML file.  Parsed files are
+    cached and only read again once their modification time changes; each
+    call returns its own copy of the cached dictionary.
     
     Args:
         yaml_filename (str):
@@ -156,8 +199,17 @@ def yaml_to_dict(yaml_filename, verbose=False):
 
     """
 
-    with open(yaml_filename) as fp:
-        output_dictionary = yaml.load(fp, Loader = yaml.FullLoader)
+    yaml_path = os.path.abspath(yaml_filename)
+    st = os.stat(yaml_path)
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _yaml_cache.get(yaml_path)
+
+    if cached is not None and cached[0] == signature:
+        output_dictionary = copy.deepcopy(cached[1])
+    else:
+        with open(yaml_filename) as fp:
+            output_dictionary = yaml.load(fp, Loader=SafeLoader)
+        _yaml_cache[yaml_path] = (signature, copy.deepcopy(output_dictionary))
 
     if verbose:
         print('Read the Dictionary:')
@@ -167,9 +219,41 @@ def yaml_to_dict(yaml_filename, verbose=False):
     return output_dictionary
 
 
+def _iter_numeric(dictionary):
+    # Walk nested dictionaries and lists with an explicit stack, yielding numeric leaves
+    stack = [dictionary.values()]
+    while stack:
+        for v in stack.pop():
+            if isinstance(v, dict):
+                stack.append(v.values())
+            elif isinstance(v, (list, tuple)):
+                stack.append(v)
+            elif isinstance(v, np.ndarray):
+                stack.append(v.ravel().tolist())
+            elif isinstance(v, (int, float, np.number)):
+                yield v
+
+
 def check_dict_for_nans(dictionary):
-    for v in dictionary.values():
-        if np.isnan(v):
-            print('WARNING!!! there is nan in output dictionary')
-            return True
+    """ Check a (possibly nested) output dictionary for NaN or infinite values.
+
+    All numeric values, including those in nested dictionaries, lists and
+    arrays, are gathered into a single NumPy array and checked at once.
+    Non-numeric entries, e.g., a job ID string, are ignored.
+
+    Args:
+        dictionary (dict):
+            The dictionary to check.
+
+    Returns:
+        bool:
+            True if any numeric value is NaN or infinite, False otherwise.
+
+    """
+
+    values = np.fromiter(_iter_numeric(dictionary), dtype=np.float64)
+
+    if not np.isfinite(values).all():
+        print('WARNING!!! there is nan or inf in output dictionary')
+        return True
     return False
@@ -66,3 +66,26 @@ def test_replacement(build_test_file, build_test_dict, build_truth_file):
     os.remove('bkup_'+test_file)
     os.remove(truth_file)
 
+
+@pytest.mark.unit
+def test_replacement_unchanged(build_test_file, build_test_dict):
+
+    test_file = build_test_file
+
+    write_file_with_replacements(test_file, dict(build_test_dict))
+
+    # Repeating the same replacements leaves the file untouched
+    os.utime(test_file, ns=(0, 0))
+    write_file_with_replacements(test_file, dict(build_test_dict))
+    assert os.stat(test_file).st_mtime_ns == 0
+
+    # New values are still written
+    write_file_with_replacements(test_file, {'A': 3.3})
+    assert os.stat(test_file).st_mtime_ns > 0
+
+    with open(test_file, 'r') as fp:
+        assert fp.readline() == 'A = 3.3;\n'
+
+    # Clean up
+    os.remove(test_file)
+    os.remove('bkup_'+test_file)
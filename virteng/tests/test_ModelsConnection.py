@@ -0,0 +1,57 @@
+import pytest
+from unittest import mock
+
+from virteng.ModelsConnection import VE_params
+
+@pytest.fixture()
+def ve(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    ve = VE_params()
+    saved_state = dict(ve.__dict__)
+    ve.__dict__.clear()
+
+    yield ve
+
+    ve.__dict__.clear()
+    ve.__dict__.update(saved_state)
+
+@pytest.mark.unit
+def test_shared_state(ve):
+    ve.feedstock = {'initial_porosity': 0.8}
+
+    assert VE_params().feedstock['initial_porosity'] == 0.8
+
+@pytest.mark.unit
+def test_load_from_file_cache(ve):
+    ve.pt_in = {'final_time': 600.0}
+    ve.write_to_file('ve_params.yml')
+    VE_params.load_from_file('ve_params.yml')
+
+    # Changes made in memory are reverted without parsing the unchanged file
+    ve.pt_in['final_time'] = 1200.0
+    with mock.patch('virteng.Utilities.yaml.load') as yaml_load:
+        ve = VE_params.load_from_file('ve_params.yml')
+        yaml_load.assert_not_called()
+
+    assert ve.pt_in['final_time'] == 600.0
+
+    # A file changed on disk (e.g., by a subprocess) is read again
+    with open('ve_params.yml', 'w') as fp:
+        fp.write('pt_in:\n  final_time: 1800.0\n')
+
+    ve = VE_params.load_from_file('ve_params.yml')
+    assert ve.pt_in['final_time'] == 1800.0
+
+@pytest.mark.unit
+def test_write_to_file_unchanged(ve):
+    ve.br_in = {'t_final': 100.0}
+    ve.write_to_file('ve_params.yml')
+
+    with mock.patch('virteng.ModelsConnection.dict_to_yaml') as dict_to_yaml:
+        ve.write_to_file('ve_params.yml')
+        dict_to_yaml.assert_not_called()
+
+        ve.br_in['t_final'] = 200.0
+        ve.write_to_file('ve_params.yml')
+        dict_to_yaml.assert_called_once()
@@ -0,0 +1,285 @@
+import pytest
+import sys
+import logging
+import textwrap
+from types import SimpleNamespace
+
+from virteng.WidgetFunctions import WidgetCollection, OptimizationWidget
+
+models_classes_source = '''
+from virteng.ModelsConnection import VE_params
+
+class Paraboloid:
+    n_runs = 0
+
+    def __init__(self):
+        self.ve = VE_params()
+        self.x = 0.0
+        self.y = 0.0
+
+    def run(self, verbose=False):
+        Paraboloid.n_runs += 1
+        self.ve.quad_out = {'f': 10.0 - (self.x - 1.0)**2 - (self.y + 2.0)**2}
+        return False
+
+def make_models_list(options_list, n_models=1, hpc_run=False):
+    return [Paraboloid()]
+
+def make_output_names():
+    return ['quad_out']
+'''
+
+@pytest.fixture()
+def build_case_folder(tmp_path, monkeypatch):
+    with open(tmp_path / 'Models_classes.py', 'w') as fp:
+        fp.write(textwrap.dedent(models_classes_source))
+
+    # Make sure this case folder's models are the ones imported
+    monkeypatch.delitem(sys.modules, 'Models_classes', raising=False)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+
+    return str(tmp_path)
+
+@pytest.fixture()
+def build_optimization(build_case_folder):
+    from virteng.OptimizationFunctions import Optimization
+
+    options = WidgetCollection()
+    options.x = OptimizationWidget('BoundedFloatText', {'value': 0.0, 'min': -4.0, 'max': 4.0}, controlvalue=True)
+    options.y = OptimizationWidget('BoundedFloatText', {'value': 0.0, 'min': -4.0, 'max': 4.0}, controlvalue=True)
+
+    obj_widget = SimpleNamespace(value=('quad_out', 'f'))
+
+    return Optimization(build_case_folder, [options], obj_widget, hpc_run=False)
+
+@pytest.fixture()
+def build_boundary_optimization(build_case_folder):
+    from virteng.OptimizationFunctions import Optimization
+
+    # x starts at an upper bound that doesn't round-trip exactly through the
+    # results file, scaling it back gives 1.0000000000000004
+    options = WidgetCollection()
+    options.x = OptimizationWidget('BoundedFloatText', {'value': 3.47, 'min': 1.36, 'max': 3.47}, controlvalue=True)
+    options.y = OptimizationWidget('BoundedFloatText', {'value': 0.0, 'min': -4.0, 'max': 4.0}, controlvalue=True)
+
+    obj_widget = SimpleNamespace(value=('quad_out', 'f'))
+
+    return Optimization(build_case_folder, [options], obj_widget, hpc_run=False)
+
+@pytest.mark.unit
+def test_objective_function_cache(build_optimization):
+    Opt = build_optimization
+
+    Models_classes = sys.modules['Models_classes']
+    n_runs = Models_classes.Paraboloid.n_runs
+
+    f_0 = Opt.objective_function([0.5, 0.5])
+    f_1 = Opt.objective_function([0.5, 0.5])
+
+    assert f_0 == pytest.approx(-1.0)
+    assert f_1 == pytest.approx(f_0)
+    assert Models_classes.Paraboloid.n_runs == n_runs + 1
+    assert Opt.fn_evals == 1
+
+@pytest.mark.unit
+@pytest.mark.parametrize('parallel_runs', [True, False])
+def test_parallel_jac(build_optimization, monkeypatch, parallel_runs):
+    Opt = build_optimization
+    Opt.parallel_runs = parallel_runs
+    if not parallel_runs:
+        # Serial evaluations must not start any workers
+        monkeypatch.setitem(sys.modules, 'joblib', None)
+
+    # At the initial point (x, y) = (0, 0) the objective is -f = -5, which
+    # also sets the objective scaling to 0.2
+    jac = Opt._parallel_jac([0.5, 0.5])
+
+    # d(-0.2*f)/du with x = 8*u - 4 and y = 8*u - 4
+    truth = [0.2*2.0*(0.0 - 1.0)*8.0, 0.2*2.0*(0.0 + 2.0)*8.0]
+
+    assert Opt.objective_scaling == pytest.approx(0.2)
+    assert jac == pytest.approx(truth, abs=2e-3)
+    assert Opt.fn_evals == 3
+
+@pytest.mark.unit
+def test_dimensional_values_jit(build_optimization):
+    Opt = build_optimization
+
+    x = [0.25, 0.875]
+    dimensional_values = Opt._dimensional_values(x)
+
+    Opt.use_jit = True
+    assert Opt._dimensional_values(x) == pytest.approx(dimensional_values)
+    assert dimensional_values == pytest.approx([-2.0, 3.0])
+
+@pytest.mark.unit
+def test_objective_function_clips_to_bounds(build_optimization):
+    Opt = build_optimization
+
+    with pytest.warns(UserWarning, match='out-of-bounds'):
+        f_0 = Opt.objective_function([1.0 + 1e-9, 0.5])
+
+    assert f_0 == pytest.approx(Opt.objective_function([1.0, 0.5]))
+
+@pytest.mark.unit
+@pytest.mark.parametrize('method', ['L-BFGS-B', 'SLSQP', 'COBYLA'])
+@pytest.mark.filterwarnings('error:Optimizer proposed an out-of-bounds point')
+def test_scipy_minimize(build_optimization, method):
+    Opt = build_optimization
+
+    opt_result = Opt.scipy_minimize(Opt.objective_function, method=method)
+
+    assert opt_result.x[0]*8.0 - 4.0 == pytest.approx(1.0, abs=1e-3)
+    assert opt_result.x[1]*8.0 - 4.0 == pytest.approx(-2.0, abs=1e-3)
+
+    with open('optimization_results.csv') as fp:
+        lines = fp.readlines()
+
+    assert lines[0] == '# Iteration, , , Objective\n'
+    assert len(lines) == Opt.fn_evals + 1
+
+    best_controls, best_obj = Opt.get_best()
+    assert best_controls['x'] == pytest.approx(1.0, abs=1e-3)
+    assert best_controls['y'] == pytest.approx(-2.0, abs=1e-3)
+    assert best_obj == pytest.approx(10.0)
+
+@pytest.mark.unit
+@pytest.mark.filterwarnings('error::scipy.optimize.OptimizeWarning', 'error::RuntimeWarning')
+def test_scipy_minimize_derivative_free(build_optimization):
+    Opt = build_optimization
+
+    # Nelder-Mead takes neither ftol nor a Jacobian
+    opt_result = Opt.scipy_minimize(Opt.objective_function, method='Nelder-Mead', maxiter=200)
+
+    assert opt_result.x[0]*8.0 - 4.0 == pytest.approx(1.0, abs=1e-2)
+    assert opt_result.x[1]*8.0 - 4.0 == pytest.approx(-2.0, abs=1e-2)
+
+@pytest.mark.unit
+@pytest.mark.parametrize('parallel_runs', [True, False])
+def test_parameter_grid_sweep(build_optimization, monkeypatch, parallel_runs):
+    Opt = build_optimization
+    Opt.parallel_runs = parallel_runs
+
+    if parallel_runs:
+        Opt.parameter_grid_sweep(nn=2, results_file='sweep_params.csv')
+    else:
+        # Serial sweeps must not start any workers, even if asked to
+        monkeypatch.setitem(sys.modules, 'joblib', None)
+        with pytest.warns(UserWarning, match='serially'):
+            Opt.parameter_grid_sweep(nn=2, results_file='sweep_params.csv', n_jobs=2)
+
+    with open('sweep_params.csv') as fp:
+        lines = fp.readlines()
+
+    assert lines[0] == '# Iteration, , , f\n'
+    assert len(lines) == 5
+
+    truth_values = [(-2.0, -2.0, 1.0), (-2.0, 2.0, -15.0), (2.0, -2.0, 9.0), (2.0, 2.0, -7.0)]
+
+    for k, (line, truth) in enumerate(zip(lines[1:], truth_values)):
+        values = [float(v) for v in line.split(',')]
+        assert values[0] == k + 1
+        assert values[1:] == pytest.approx(truth)
+
+@pytest.mark.unit
+def test_skopt_minimize(build_optimization):
+    pytest.importorskip('skopt')
+    Opt = build_optimization
+
+    opt_result = Opt.skopt_minimize(n_calls=20, n_parallel=2)
+
+    assert Opt.fn_evals >= 20
+    assert -opt_result.fun * 5.0 == pytest.approx(10.0, abs=0.5)
+
+@pytest.mark.unit
+def test_scipy_minimize_resume(build_optimization, caplog):
+    Opt = build_optimization
+    opt_result = Opt.scipy_minimize(Opt.objective_function)
+    n_evals = Opt.fn_evals
+
+    # Restart with no memory of the first run, every point should be read
+    # back from the results file instead of running the models
+    Opt._obj_cache = {}
+    Opt._last_dv = None
+    Opt.fn_evals = 0
+
+    Models_classes = sys.modules['Models_classes']
+    n_runs = Models_classes.Paraboloid.n_runs
+
+    opt_result_resumed = Opt.scipy_minimize(Opt.objective_function, resume=True, verbose=True)
+
+    assert f'Resuming from {n_evals} evaluations' in caplog.text
+    assert Models_classes.Paraboloid.n_runs == n_runs
+    assert Opt.fn_evals == n_evals
+    assert opt_result_resumed.x == pytest.approx(opt_result.x)
+
+@pytest.mark.unit
+def test_scipy_minimize_resume_at_bounds(build_boundary_optimization):
+    Opt = build_boundary_optimization
+    Opt.scipy_minimize(Opt.objective_function, maxiter=2)
+    n_evals = Opt.fn_evals
+
+    Opt._obj_cache = {}
+    Opt._last_dv = None
+    Opt.fn_evals = 0
+
+    Models_classes = sys.modules['Models_classes']
+    n_runs = Models_classes.Paraboloid.n_runs
+
+    prior_xs, _ = Opt._open_results_file('optimization_results.csv', resume=True)
+    Opt._results_fp.close()
+
+    assert len(prior_xs) == n_evals
+    assert all(0.0 <= xi <= 1.0 for x in prior_xs for xi in x)
+    assert prior_xs[0][0] == 1.0
+
+    # The initial point is still served from the results file
+    Opt.objective_function(Opt.x_0)
+    assert Models_classes.Paraboloid.n_runs == n_runs
+
+@pytest.mark.unit
+def test_skopt_minimize_resume_at_bounds(build_boundary_optimization):
+    pytest.importorskip('skopt')
+    Opt = build_boundary_optimization
+    Opt.scipy_minimize(Opt.objective_function, maxiter=2)
+    n_evals = Opt.fn_evals
+
+    Opt._obj_cache = {}
+    Opt._last_dv = None
+    Opt.fn_evals = 0
+
+    # With no checkpoint the optimizer is told every point in the results file
+    Opt.skopt_minimize(n_calls=n_evals + 2, n_parallel=2, resume=True)
+
+    assert Opt.fn_evals == n_evals + 2
+
+@pytest.mark.unit
+@pytest.mark.parametrize('verbose', [True, False])
+def test_scipy_minimize_verbose(build_optimization, caplog, verbose):
+    Opt = build_optimization
+
+    Opt.scipy_minimize(Opt.objective_function, verbose=verbose)
+
+    iteration_records = [r for r in caplog.records if r.getMessage().startswith('Iter =')]
+    assert (len(iteration_records) == Opt.fn_evals) is verbose
+
+@pytest.mark.unit
+def test_set_log_verbosity_with_root_handler(monkeypatch):
+    from virteng import OptimizationFunctions
+
+    monkeypatch.setattr(OptimizationFunctions.log, 'handlers', [])
+    monkeypatch.setattr(logging.getLogger(), 'handlers', [logging.NullHandler()])
+
+    OptimizationFunctions._set_log_verbosity(True)
+
+    # The root handler already reports the iterations, a second one would print them twice
+    assert OptimizationFunctions.log.handlers == []
+
+@pytest.mark.unit
+def test_scipy_minimize_wallclock_budget(build_optimization):
+    Opt = build_optimization
+
+    opt_result = Opt.scipy_minimize(Opt.objective_function, wallclock_budget_s=0.0)
+
+    assert opt_result.nit == 1
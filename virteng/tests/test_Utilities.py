@@ -3,8 +3,10 @@ import os
 from contextlib import redirect_stdout
 from io import StringIO
 import yaml
+import numpy as np
 
-from virteng.Utilities import get_host_computer, print_dict, dict_to_yaml, yaml_to_dict
+from virteng import Utilities
+from virteng.Utilities import get_host_computer, pushd, print_dict, dict_to_yaml, yaml_to_dict, check_dict_for_nans
 
 test_yaml_filename = 'temp.yaml'
 
@@ -22,6 +24,22 @@ def test_get_host_computer():
     # Clean up the manually-set variable
     del os.environ['NREL_CLUSTER']
 
+@pytest.mark.unit
+def test_pushd(tmp_path):
+    start_dir = os.getcwd()
+
+    with pushd(tmp_path):
+        assert os.getcwd() == str(tmp_path)
+
+    assert os.getcwd() == start_dir
+
+    # The original directory is restored even if the block raises
+    with pytest.raises(RuntimeError):
+        with pushd(tmp_path):
+            raise RuntimeError
+
+    assert os.getcwd() == start_dir
+
 @pytest.mark.unit
 def test_print_dict():
 
@@ -95,3 +113,33 @@ def test_yaml_to_dict():
         assert val == output_dict[key]
 
     os.remove(test_yaml_filename)
+
+@pytest.mark.unit
+def test_check_dict_for_nans():
+    assert check_dict_for_nans({}) == False
+    assert check_dict_for_nans({'rho_g': 1.0, 'rho_x': 2, 'job_id': '1234'}) == False
+
+    with redirect_stdout(StringIO()):
+        assert check_dict_for_nans({'rho_g': float('nan'), 'job_id': '1234'}) == True
+        assert check_dict_for_nans({'a': 1.0, 'b': {'c': np.nan}}) == True
+        assert check_dict_for_nans({'a': [1.0, {'b': np.inf}]}) == True
+        assert check_dict_for_nans({'a': np.array([[1.0], [np.nan]])}) == True
+
+    assert check_dict_for_nans({'a': [1.0, (2, np.float32(3.0))], 'b': np.ones(3)}) == False
+
+@pytest.mark.unit
+def test_yaml_to_dict_cache(tmp_path, monkeypatch):
+    yaml_filename = str(tmp_path / 'cached.yaml')
+    dict_to_yaml({'a': {'b': 1}}, yaml_filename)
+
+    output_dict = yaml_to_dict(yaml_filename)
+    output_dict['a']['b'] = 2
+
+    # An unchanged file is served from the cache, unaffected by the edit above
+    monkeypatch.setattr(Utilities.yaml, 'load', None)
+    assert yaml_to_dict(yaml_filename) == {'a': {'b': 1}}
+    monkeypatch.undo()
+
+    # Writing the file invalidates the cache
+    dict_to_yaml({'a': {'b': 3}}, yaml_filename)
+    assert yaml_to_dict(yaml_filename) == {'a': {'b': 3}}